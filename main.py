@@ -1,19 +1,50 @@
 """Patient Management API
 
-This small FastAPI application serves a JSON-backed list of patients. The
-project is intentionally lightweight: data are read from `patients.json` on
-each request so the app remains simple to run and inspect during
-development.
+This small FastAPI application serves a list of patients stored in a
+local SQLite database (`patients.db`, seeded from `patients.json` on first
+run). The project is intentionally lightweight so the app remains simple to
+run and inspect during development. `util.py` keeps an in-memory copy of
+the records and re-reads them only when they change.
+
+Handlers are `async`; the blocking helpers from `util.py` run in a worker
+thread via `anyio.to_thread.run_sync` so the event loop never waits on
+disk. Each write is a single SQLite transaction, so concurrent requests
+(or processes) can't interleave a check with the change it guards.
+
+The app is safe to run with several uvicorn workers: each worker warms its
+own cache at startup and picks up other workers' commits on its next
+request (see `util.load_data`).
 """
 
+from contextlib import asynccontextmanager
 from typing import Any, Dict, List, Annotated, Literal, Optional
-from pydantic import BaseModel, Field, computed_field
-from fastapi import FastAPI, Path, HTTPException, Query
-from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, computed_field, field_validator
+from fastapi import FastAPI, Header, Path, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse
 # load/save helpers live in `util.py` to keep `main.py` focused on routes.
-from util import load_data, save_data
+from util import (
+    bmi_for,
+    canonical_id,
+    delete_patient_record,
+    insert_patients,
+    load_data,
+    load_data_bytes,
+    load_data_with_etag,
+    sort_records,
+    update_patient_record,
+    verdict_for,
+)
+import anyio
+
 
-app = FastAPI(title="Patient Management System", version="1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open (and if needed seed) the database and fill the cache before serving."""
+    await anyio.to_thread.run_sync(load_data)
+    yield
+
+
+app = FastAPI(title="Patient Management System", version="1.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 class Patient(BaseModel):
     id: Annotated[str, Field(..., description="The unique identifier for the patient", example="P001")]
@@ -24,25 +55,24 @@ class Patient(BaseModel):
     height: Annotated[float, Field(..., gt=0, description="Height must be a positive number and in meters")]
     weight: Annotated[float, Field(..., gt=0, description="Weight must be a positive number and in kilograms")]
 
+    @field_validator("id")
+    @classmethod
+    def normalize_id(cls, value: str) -> str:
+        """Store IDs in canonical form so lookups by any casing find them."""
+        return canonical_id(value)
+
     @computed_field
     @property
     def bmi(self) -> float:
         """Calculate and return the Body Mass Index (BMI) for the patient."""
-        bmi = round(self.weight / (self.height ** 2), 2)
-        return bmi
+        return bmi_for(self.height, self.weight)
     
     @computed_field
     @property
     def verdict(self) -> str:
         """Provide a health verdict based on the BMI value."""
-        if self.bmi < 18.5:
-            return "Underweight"
-        elif 18.5 <= self.bmi < 24.9:
-            return "Normal weight"
-        elif 25 <= self.bmi < 29.9:
-            return "Overweight"
-        else:
-            return "Obesity"
+        # shares its thresholds with the batch `util.verdict_codes` kernel
+        return verdict_for(self.bmi)
         
 class PatientUpdate(BaseModel):
     name: Annotated[Optional[str], Field(default=None)]
@@ -53,8 +83,47 @@ class PatientUpdate(BaseModel):
     weight: Annotated[Optional[float], Field(default=None, gt=0)]
 
 
+def _to_row(patient: Patient) -> Dict[str, Any]:
+    """Return the stored form of `patient`: its fields minus ``id``, plus BMI and verdict.
+
+    Reads the validated values straight from ``__dict__`` instead of going
+    through Pydantic's serializer, which is all this flat model needs.
+    """
+    row = patient.__dict__.copy()
+    del row["id"]
+    bmi = patient.bmi
+    row["bmi"] = bmi
+    row["verdict"] = verdict_for(bmi)
+    return row
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+# Per-field checks mirroring the `Patient` constraints. `update_patient`
+# runs only the checks for the fields a request actually sends instead of
+# re-validating the whole merged record through `Patient`.
+_FIELD_VALIDATORS = {
+    "name": lambda v: isinstance(v, str) and 2 <= len(v) <= 50,
+    "city": lambda v: isinstance(v, str) and 2 <= len(v) <= 100,
+    "age": lambda v: isinstance(v, int) and not isinstance(v, bool) and v > 0,
+    "gender": lambda v: v in ("male", "female", "others"),
+    "height": lambda v: _is_number(v) and v > 0,
+    "weight": lambda v: _is_number(v) and v > 0,
+}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header value covers `etag`."""
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
 @app.get("/", summary="Health / basic info")
-def hello_world() -> Dict[str, str]:
+async def hello_world() -> Dict[str, str]:
     """A tiny health-check and entry point.
 
     Returns a short message so you can verify the app is running in a
@@ -64,40 +133,54 @@ def hello_world() -> Dict[str, str]:
 
 
 @app.get("/about", summary="About this service")
-def about() -> Dict[str, str]:
+async def about() -> Dict[str, str]:
     """Short description useful for documentation pages or service checks."""
-    return {"message": "A simple, file-backed Patient Management System"}
+    return {"message": "A simple, SQLite-backed Patient Management System"}
 
 
-@app.get("/view", summary="Return all patients")
-def view_patients() -> Dict[str, Any]:
+@app.get("/view", summary="Return all patients", response_model=Dict[str, Any])
+async def view_patients(if_none_match: Optional[str] = Header(None)) -> Response:
     """Return the raw patients dictionary.
 
-    This endpoint returns the file contents exactly as stored. Consumers can
-    decide how to present or paginate the results.
+    This endpoint returns every stored record keyed by ID. Consumers can
+    decide how to present or paginate the results. The body is the cached,
+    pre-encoded JSON from `util.load_data_bytes`, so nothing is serialized
+    per request. Clients that send back the ``ETag`` in ``If-None-Match``
+    get an empty 304 until the data changes.
     """
-    return load_data()
+    body, etag = await anyio.to_thread.run_sync(load_data_bytes)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 
 @app.get("/patient/{patient_id}", summary="Get patient by ID")
-def view_patient(
-    patient_id: str = Path(..., description="The ID of the patient to retrieve", example="P001")
+async def view_patient(
+    response: Response,
+    patient_id: str = Path(..., description="The ID of the patient to retrieve", example="P001"),
+    if_none_match: Optional[str] = Header(None),
 ) -> Dict[str, Any]:
     """Return a single patient record.
 
     The function normalizes the provided id (strip + upper) so callers don't
     need to worry about whitespace or case. If the patient is not found the
-    endpoint returns a 404.
+    endpoint returns a 404. The ``ETag`` is a version tag of the whole
+    dataset (any change to any record changes it), so a matching
+    ``If-None-Match`` gets a 304.
     """
-    data = load_data()
-    patient_id = patient_id.strip().upper()
-    if patient_id in data:
-        return data[patient_id]
+    data, etag = await anyio.to_thread.run_sync(load_data_with_etag)
+    # keys are canonicalized when the cache is built, so only the query needs normalizing
+    patient = data.get(canonical_id(patient_id))
+    if patient is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return patient
     raise HTTPException(status_code=404, detail="Patient not found")
 
 
 @app.get("/sort/", summary="Sort patients by a numeric field")
-def sort_patients(
+async def sort_patients(
     sort_by: str = Query(..., description="The field to sort by", example="bmi"),
     order: str = Query("asc", description="Sort order: asc or desc", example="asc"),
 ) -> List[Dict[str, Any]]:
@@ -111,57 +194,69 @@ def sort_patients(
         raise HTTPException(status_code=400, detail=f"Invalid sort field. Must be one of {valid_sort_fields}")
     if order not in ["asc", "desc"]:
         raise HTTPException(status_code=400, detail="Invalid order. Must be 'asc' or 'desc'")
-    data = load_data()
-    # sort the dict values by the requested numeric key
-    sorted_data = sorted(data.values(), key=lambda x: x.get(sort_by, 0), reverse=(order == "desc"))
-    return sorted_data
+    # sorting runs as a NumPy argsort over cached columns (see util.sort_records)
+    return await anyio.to_thread.run_sync(sort_records, sort_by, order == "desc")
 
 
 @app.post("/create/", summary="Add a new patient")
-def create_patient(patient: Patient) -> Dict[str, Any]:
+async def create_patient(patient: Patient) -> Dict[str, Any]:
     """Add a new patient record."""
-    data = load_data()
-    # Check if tyhe patient ID already exists
-    if patient.id in data:
+    row = _to_row(patient)
+    # the insert itself rejects an existing ID, so there's no check-then-write race
+    if await anyio.to_thread.run_sync(insert_patients, {patient.id: row}):
         raise HTTPException(status_code=400, detail="Patient ID already exists")
-    # Add the new patient to the data
-    data[patient.id] = patient.model_dump(exclude=['id'])
-    # Save the updated data back to the JSON file
-    save_data(data)
-    return JSONResponse(status_code=201, content={"message": "Patient created successfully", "patient": patient.model_dump() })
+    return ORJSONResponse(status_code=201, content={"message": "Patient created successfully", "patient": {"id": patient.id, **row} })
+
+@app.post("/create_many/", summary="Add several patients in one request")
+async def create_many(patients: List[Patient]) -> Dict[str, Any]:
+    """Add a batch of patient records with a single write.
+
+    The whole batch is rejected with a 400 if any ID already exists or is
+    repeated within the batch, so either every patient is created or none.
+    """
+    rows = {}
+    dupes = set()
+    for p in patients:
+        if p.id in rows:
+            dupes.add(p.id)
+        rows[p.id] = _to_row(p)
+    if not dupes:
+        # one transaction for the whole batch instead of one per patient
+        dupes.update(await anyio.to_thread.run_sync(insert_patients, rows))
+    if dupes:
+        raise HTTPException(status_code=400, detail=f"Duplicate or existing patient IDs: {sorted(dupes)}")
+    return ORJSONResponse(status_code=201, content={"message": "Patients created successfully", "created": len(patients)})
 
 @app.put("/edit/{patient_id}", summary="Update an existing patient")
-def update_patient(patient_id:str,patient_update: PatientUpdate):
-    data = load_data()
-    if patient_id not in data:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    existing_patient = data[patient_id]
+async def update_patient(patient_id:str,patient_update: PatientUpdate):
+    """Update the fields sent in the request body.
+
+    Only the changed fields are validated (see `_FIELD_VALIDATORS`) and
+    written; BMI and verdict follow from the stored height and weight.
+    Invalid values are rejected with a 422 and leave the stored record
+    untouched.
+    """
     patient_update_dict = patient_update.model_dump(exclude_unset=True)
     for key, value in patient_update_dict.items():
-        existing_patient[key] = value
-
-    existing_patient['id'] = patient_id
-    patient_pydentic_obj = Patient(**existing_patient)
+        if not _FIELD_VALIDATORS[key](value):
+            raise HTTPException(status_code=422, detail=f"Invalid value for '{key}'")
 
-    existing_patient = patient_pydentic_obj.model_dump(exclude=['id'])
-    data[patient_id] = existing_patient
-    # Update the patient record in the data
-    save_data(data)
-    return JSONResponse(status_code=200, content={"message": "Patient updated successfully", "patient": existing_patient })
+    existing_patient = await anyio.to_thread.run_sync(
+        update_patient_record, canonical_id(patient_id), patient_update_dict
+    )
+    if existing_patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return ORJSONResponse(status_code=200, content={"message": "Patient updated successfully", "patient": existing_patient })
 
 
 @app.delete("/delete/{patient_id}", summary="Delete a patient by ID")
-def delete_patient(
+async def delete_patient(
     patient_id: str = Path(..., description="The ID of the patient to delete", example="P001")
 ) -> Dict[str, str]:
     """Delete a patient record by ID.
 
     If the patient is not found the endpoint returns a 404.
     """
-    data = load_data()
-    patient_id = patient_id.strip().upper()
-    if patient_id in data:
-        del data[patient_id]
-        save_data(data)
+    if await anyio.to_thread.run_sync(delete_patient_record, canonical_id(patient_id)):
         return {"message": "Patient deleted successfully"}
     raise HTTPException(status_code=404, detail="Patient not found")
\ No newline at end of file
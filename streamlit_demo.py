@@ -11,7 +11,9 @@ Then run this Streamlit app:
 """
 
 import streamlit as st
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 import json
 from typing import Dict, Any, List
 
@@ -19,22 +21,61 @@ from typing import Dict, Any, List
 # Configuration
 API_BASE_URL = "http://127.0.0.1:8002"
 
+# Display colour for each verdict the API returns.
+VERDICT_COLORS = {
+    "Underweight": "blue",
+    "Normal weight": "green",
+    "Overweight": "orange",
+    "Obesity": "red",
+}
+
+
+def get_http_session() -> requests.Session:
+    """Return this browser session's pooled HTTP client.
+
+    A single `requests.Session` is kept in `st.session_state` so every API
+    call reuses a kept-alive connection instead of opening a new one.
+    """
+    if "http" not in st.session_state:
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10))
+        session.headers["Connection"] = "keep-alive"
+        st.session_state.http = session
+    return st.session_state.http
+
 
 def get_all_patients() -> Dict[str, Any]:
-    """Fetch all patients from the API."""
+    """Fetch all patients from the API.
+
+    The last response and its ETag are kept in `st.session_state`; sending
+    the ETag back lets the API answer 304 with no body when nothing changed.
+    The revalidation is cheap, so this reader is not memoized with
+    `st.cache_data`, whose cache is shared across sessions.
+    """
     try:
-        response = requests.get(f"{API_BASE_URL}/view")
+        last = st.session_state.get("all_patients")
+        headers = {"If-None-Match": last["etag"]} if last else {}
+        response = get_http_session().get(f"{API_BASE_URL}/view", headers=headers)
+        if response.status_code == 304 and last:
+            return last["patients"]
         response.raise_for_status()
-        return response.json()
+        patients = response.json()
+        if "ETag" in response.headers:
+            st.session_state.all_patients = {"etag": response.headers["ETag"], "patients": patients}
+        return patients
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching patients: {e}")
         return {}
 
 
+# The remaining reads are memoized for a few seconds because Streamlit
+# reruns the whole script on every widget interaction; writers call
+# `st.cache_data.clear()`.
+@st.cache_data(ttl=5, show_spinner=False)
 def get_patient_by_id(patient_id: str) -> Dict[str, Any]:
     """Fetch a specific patient by ID."""
     try:
-        response = requests.get(f"{API_BASE_URL}/patient/{patient_id}")
+        response = get_http_session().get(f"{API_BASE_URL}/patient/{patient_id}")
         if response.status_code == 404:
             st.error("Patient not found")
             return {}
@@ -49,9 +90,10 @@ def create_patient(patient_data: Dict[str, Any]) -> bool:
     """Create a new patient."""
     try:
         with st.spinner(f"Creating patient {patient_data.get('id', 'Unknown')}..."):
-            response = requests.post(f"{API_BASE_URL}/create/", json=patient_data)
+            response = get_http_session().post(f"{API_BASE_URL}/create/", json=patient_data)
             
             if response.status_code == 201:
+                st.cache_data.clear()
                 st.success(f"✅ Patient {patient_data.get('id')} created successfully!")
                 return True
             elif response.status_code == 400:
@@ -73,11 +115,38 @@ def create_patient(patient_data: Dict[str, Any]) -> bool:
         return False
 
 
+def create_patients(patients_data: List[Dict[str, Any]]) -> bool:
+    """Create several patients with one call to the bulk endpoint."""
+    try:
+        with st.spinner(f"Creating {len(patients_data)} patients..."):
+            response = get_http_session().post(f"{API_BASE_URL}/create_many/", json=patients_data)
+
+            if response.status_code == 201:
+                st.cache_data.clear()
+                st.success(f"✅ {response.json().get('created')} patients created successfully!")
+                return True
+            elif response.status_code in (400, 422):
+                error_detail = response.json().get('detail', 'Bad request')
+                st.error(f"❌ Failed to create patients: {error_detail}")
+                return False
+            else:
+                st.error(f"❌ Unexpected response: {response.status_code} - {response.text}")
+                return False
+
+    except requests.exceptions.ConnectionError:
+        st.error("❌ Cannot connect to FastAPI server. Is it running on port 8002?")
+        return False
+    except requests.exceptions.RequestException as e:
+        st.error(f"❌ Unexpected error: {str(e)}")
+        return False
+
+
 def update_patient(patient_id: str, update_data: Dict[str, Any]) -> bool:
     """Update an existing patient."""
     try:
-        response = requests.put(f"{API_BASE_URL}/edit/{patient_id}", json=update_data)
+        response = get_http_session().put(f"{API_BASE_URL}/edit/{patient_id}", json=update_data)
         response.raise_for_status()
+        st.cache_data.clear()
         st.success(f"✅ Patient {patient_id} updated successfully!")
         st.info("📋 Updated patient data:")
         st.json(update_data)
@@ -90,18 +159,20 @@ def update_patient(patient_id: str, update_data: Dict[str, Any]) -> bool:
 def delete_patient(patient_id: str) -> bool:
     """Delete a patient."""
     try:
-        response = requests.delete(f"{API_BASE_URL}/delete/{patient_id}")
+        response = get_http_session().delete(f"{API_BASE_URL}/delete/{patient_id}")
         response.raise_for_status()
+        st.cache_data.clear()
         return True
     except requests.exceptions.RequestException as e:
         st.error(f"Error deleting patient: {e}")
         return False
 
 
+@st.cache_data(ttl=5, show_spinner=False)
 def sort_patients(sort_by: str, order: str) -> List[Dict[str, Any]]:
     """Sort patients by a field."""
     try:
-        response = requests.get(f"{API_BASE_URL}/sort/", params={"sort_by": sort_by, "order": order})
+        response = get_http_session().get(f"{API_BASE_URL}/sort/", params={"sort_by": sort_by, "order": order})
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -123,7 +194,7 @@ def main():
     st.sidebar.title("Navigation")
     page = st.sidebar.selectbox(
         "Choose a page",
-        ["View All Patients", "Search Patient", "Create Patient", "Update Patient", "Delete Patient", "Sort Patients"]
+        ["View All Patients", "Search Patient", "Create Patient", "Bulk Create Patients", "Update Patient", "Delete Patient", "Sort Patients"]
     )
     
     if page == "View All Patients":
@@ -134,18 +205,11 @@ def main():
         
         patients = get_all_patients()
         if patients:
-            # Convert to list for table display
-            patient_list = []
-            for patient_id, patient_data in patients.items():
-                patient_record = {"ID": patient_id, **patient_data}
-                # Calculate BMI if height and weight are available
-                if "height" in patient_data and "weight" in patient_data:
-                    bmi = round(patient_data["weight"] / (patient_data["height"] ** 2), 2)
-                    patient_record["BMI"] = bmi
-                patient_list.append(patient_record)
+            # Convert to a table keyed by ID for display; records already carry bmi/verdict
+            df = pd.DataFrame.from_dict(patients, orient="index").rename_axis("ID").reset_index()
             
-            st.dataframe(patient_list, use_container_width=True)
-            st.info(f"Total patients: {len(patient_list)}")
+            st.dataframe(df, use_container_width=True)
+            st.info(f"Total patients: {len(df)}")
         else:
             st.warning("No patients found or unable to connect to API")
     
@@ -160,41 +224,31 @@ def main():
                 if patient:
                     st.success(f"Patient {patient_id} found!")
                     
+                    # Look every field up once and reuse the locals below
+                    name, age, gender, city, height, weight, bmi, verdict = (
+                        patient.get(k, "N/A")
+                        for k in ("name", "age", "gender", "city", "height", "weight", "bmi", "verdict")
+                    )
+                    
                     # Display patient info in a nice format
                     col1, col2 = st.columns(2)
                     
                     with col1:
                         st.subheader("Basic Information")
-                        st.write(f"**Name:** {patient.get('name', 'N/A')}")
-                        st.write(f"**Age:** {patient.get('age', 'N/A')}")
-                        st.write(f"**Gender:** {patient.get('gender', 'N/A')}")
-                        st.write(f"**City:** {patient.get('city', 'N/A')}")
+                        st.write(f"**Name:** {name}")
+                        st.write(f"**Age:** {age}")
+                        st.write(f"**Gender:** {gender}")
+                        st.write(f"**City:** {city}")
                     
                     with col2:
                         st.subheader("Health Metrics")
-                        st.write(f"**Height:** {patient.get('height', 'N/A')} m")
-                        st.write(f"**Weight:** {patient.get('weight', 'N/A')} kg")
+                        st.write(f"**Height:** {height} m")
+                        st.write(f"**Weight:** {weight} kg")
                         
-                        # Calculate and display BMI
-                        if "height" in patient and "weight" in patient:
-                            bmi = round(patient["weight"] / (patient["height"] ** 2), 2)
-                            st.write(f"**BMI:** {bmi}")
-                            
-                            # BMI verdict
-                            if bmi < 18.5:
-                                verdict = "Underweight"
-                                color = "blue"
-                            elif 18.5 <= bmi < 24.9:
-                                verdict = "Normal weight"
-                                color = "green"
-                            elif 25 <= bmi < 29.9:
-                                verdict = "Overweight"
-                                color = "orange"
-                            else:
-                                verdict = "Obesity"
-                                color = "red"
-                            
-                            st.markdown(f"**Verdict:** :{color}[{verdict}]")
+                        # BMI and verdict come from the API so they always match its rules
+                        st.write(f"**BMI:** {bmi}")
+                        color = VERDICT_COLORS.get(verdict, "gray")
+                        st.markdown(f"**Verdict:** :{color}[{verdict}]")
                 else:
                     st.error("Patient not found")
             else:
@@ -243,6 +297,33 @@ def main():
                 else:
                     st.error("❌ Please fill in all required fields marked with *")
     
+    elif page == "Bulk Create Patients":
+        st.header("📥 Bulk Create Patients")
+        st.caption("Add one row per patient. All rows are sent in a single request; rows without an ID are ignored.")
+
+        with st.form("bulk_create_form"):
+            rows = st.data_editor(
+                [{"id": "", "name": "", "city": "", "age": 30, "gender": "male", "height": 1.75, "weight": 70.0}],
+                num_rows="dynamic",
+                use_container_width=True,
+                column_config={
+                    "gender": st.column_config.SelectboxColumn("gender", options=["male", "female", "others"], required=True),
+                    "age": st.column_config.NumberColumn("age", min_value=1, max_value=120, step=1),
+                    "height": st.column_config.NumberColumn("height (m)", min_value=0.5, max_value=3.0, step=0.01),
+                    "weight": st.column_config.NumberColumn("weight (kg)", min_value=10.0, max_value=500.0, step=0.1),
+                },
+            )
+
+            submitted = st.form_submit_button("Create Patients")
+
+            if submitted:
+                patients_data = [row for row in rows if row.get("id")]
+                if patients_data:
+                    if create_patients(patients_data):
+                        st.info("🔄 You can now view the patients in 'View All Patients'")
+                else:
+                    st.error("❌ Please add at least one row with a Patient ID")
+
     elif page == "Update Patient":
         st.header("✏️ Update Patient")
         
@@ -367,11 +448,7 @@ def main():
             if sorted_patients:
                 st.subheader(f"Patients sorted by {sort_by} ({order}ending)")
                 
-                # Add calculated BMI to display
-                for patient in sorted_patients:
-                    if "height" in patient and "weight" in patient:
-                        patient["BMI"] = round(patient["weight"] / (patient["height"] ** 2), 2)
-                
+                # records already carry the server-computed bmi/verdict
                 st.dataframe(sorted_patients, use_container_width=True)
             else:
                 st.warning("No patients found or unable to sort")
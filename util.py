@@ -1,29 +1,365 @@
 """Utility helpers for data persistence.
 
 This module contains the small, synchronous helpers used by the demo
-application to load and save the `patients.json` file. Keeping these in a
+application to read and write patient records. Keeping these in a
 separate module makes `main.py` easier to read and test.
+
+Records live in a SQLite database (`patients.db`) opened in WAL mode, so
+each insert, update or delete only touches the affected rows and readers
+are never blocked by a writer. On first run the table is seeded from
+`patients.json`.
+
+All records are also kept in memory and only re-read when `PRAGMA
+data_version` reports a commit from another connection, so request
+handlers don't query the database on every call. `load_data_bytes`
+additionally memoizes the compact JSON encoding of the cache, plus an
+ETag derived from it, so read-only endpoints can send it without
+re-serializing (or skip sending it when the client's copy is current),
+and `sort_records` keeps the numeric fields as NumPy columns so sorting
+is a single `argsort` instead of a Python-level comparison loop. BMI
+itself comes from a generated SQLite column; on a full reload the
+verdicts are classified in one vectorized pass by `verdict_codes`.
+
+Patient IDs are canonicalized (see `canonical_id`) before they are
+stored, so lookups need no further normalization of the stored keys.
+
+The helpers are synchronous but thread-safe: the API calls them from a
+worker thread pool, so the connection and cached state are guarded by a
+lock.
+"""
+from bisect import bisect_right
+from contextlib import contextmanager
+from operator import itemgetter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import orjson
+
+DB_FILE = "patients.db"
+# Initial data imported into an empty database.
+SEED_FILE = "patients.json"
+
+# Upper BMI bounds (exclusive) for each verdict; anything above the last
+# bound is the final verdict.
+BMI_THRESHOLDS = (18.5, 24.9, 29.9)
+VERDICTS = ("Underweight", "Normal weight", "Overweight", "Obesity")
+
+# Stored patient fields, in column order. `bmi` is derived by SQLite.
+FIELDS = ("name", "city", "age", "gender", "height", "weight")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    city TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    gender TEXT NOT NULL,
+    height REAL NOT NULL,
+    weight REAL NOT NULL,
+    bmi REAL GENERATED ALWAYS AS (weight / (height * height)) VIRTUAL
+)
 """
-from typing import Any, Dict
-import json
+_SELECT = "SELECT id, " + ", ".join(FIELDS) + ", bmi FROM patients"
+_INSERT = "INSERT INTO patients (id, {}) VALUES (?, {})".format(
+    ", ".join(FIELDS), ", ".join("?" for _ in FIELDS)
+)
+
+# Bound parameters per statement; older SQLite builds allow at most 999.
+_MAX_PARAMS = 900
+
+_CONN: Optional[sqlite3.Connection] = None
+# In-memory copy of the table keyed by patient ID, and the `data_version`
+# it was read at. Only this module mutates it, always under `_LOCK`.
+_CACHE: Optional[Dict[str, Any]] = None
+_DATA_VERSION: int = -1
+# Compact JSON encoding of `_CACHE`; built lazily, dropped whenever the cache changes.
+_CACHE_BYTES: Optional[bytes] = None
+# Quoted content hash of `_CACHE_BYTES`, used as the HTTP ETag of the data.
+_ETAG: Optional[str] = None
+# Bumped by `_invalidate` on every change to `_CACHE`. Together with the
+# per-process `_BOOT_ID` it names a snapshot without hashing it, so tags
+# from different processes (or restarts) never collide.
+_GENERATION: int = 0
+_BOOT_ID = os.urandom(4).hex()
+# Column-wise (structure-of-arrays) view of `_CACHE` used for sorting.
+# `_ARRAYS[field][i]` belongs to the record `_ROWS[i]`; rebuilt lazily.
+_ARRAYS: Optional[Dict[str, np.ndarray]] = None
+_ROWS: List[Dict[str, Any]] = []
+# Guards the connection and every module-level cache above.
+_LOCK = threading.Lock()
+
+
+def canonical_id(patient_id: str) -> str:
+    """Return the stored form of a patient ID (whitespace stripped, upper case)."""
+    return patient_id.strip().upper()
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run the enclosed statements as one write transaction."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _read_seed() -> Dict[str, Any]:
+    """Parse `SEED_FILE` straight from a read-only memory map.
+
+    orjson parses the mapped pages directly, so the file is never copied
+    into an intermediate bytes object first.
+    """
+    with open(SEED_FILE, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+
+
+def _connect() -> sqlite3.Connection:
+    """Return the shared connection, creating and seeding the database on first use."""
+    global _CONN
+    if _CONN is None:
+        conn = sqlite3.connect(DB_FILE, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SCHEMA)
+        with _transaction(conn):
+            empty = conn.execute("SELECT 1 FROM patients LIMIT 1").fetchone() is None
+            if empty and os.path.exists(SEED_FILE):
+                seed = _read_seed()
+                conn.executemany(
+                    _INSERT,
+                    ((canonical_id(k), *(v[f] for f in FIELDS)) for k, v in seed.items()),
+                )
+        _CONN = conn
+    return _CONN
+
+
+def _record(row: Tuple[Any, ...], bmi: float, verdict: str) -> Dict[str, Any]:
+    """Turn a `_SELECT` row into the API's record shape (without the id)."""
+    record = dict(zip(FIELDS, row[1:-1]))
+    record["bmi"] = bmi
+    record["verdict"] = verdict
+    return record
+
+
+def _fetch_record(conn: sqlite3.Connection, patient_id: str) -> Optional[Dict[str, Any]]:
+    """Read one patient back from the database, or ``None`` if it's missing."""
+    row = conn.execute(_SELECT + " WHERE id = ?", (patient_id,)).fetchone()
+    if row is None:
+        return None
+    bmi = round(row[-1], 2)
+    return _record(row, bmi, verdict_for(bmi))
+
+
+def _invalidate() -> None:
+    """Drop everything derived from `_CACHE`; the caller must hold `_LOCK`."""
+    global _CACHE_BYTES, _ARRAYS, _GENERATION
+    _CACHE_BYTES = None
+    _ARRAYS = None
+    _GENERATION += 1
 
 
 def load_data() -> Dict[str, Any]:
-    """Load patients from `patients.json`.
+    """Load all patients, keyed by canonical patient ID.
+
+    The table is only read again when another connection has committed
+    since the last read. The returned dict is shared and must be treated
+    as read-only; use the write helpers below to change records.
+    """
+    with _LOCK:
+        return _load_locked()
+
+
+def _load_locked() -> Dict[str, Any]:
+    """Body of `load_data`; the caller must hold `_LOCK`."""
+    global _CACHE, _DATA_VERSION
+    conn = _connect()
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if _CACHE is None or version != _DATA_VERSION:
+        rows = conn.execute(_SELECT).fetchall()
+        bmis = [round(row[-1], 2) for row in rows]
+        codes = verdict_codes(np.array(bmis, dtype=np.float64)).tolist()
+        _CACHE = {
+            row[0]: _record(row, bmi, VERDICTS[code])
+            for row, bmi, code in zip(rows, bmis, codes)
+        }
+        _DATA_VERSION = version
+        _invalidate()
+    return _CACHE
+
+
+def _encode_locked() -> Tuple[bytes, str]:
+    """Return the current JSON encoding and its ETag; the caller must hold `_LOCK`."""
+    global _CACHE_BYTES, _ETAG
+    data = _load_locked()
+    if _CACHE_BYTES is None:
+        _CACHE_BYTES = orjson.dumps(data)
+        _ETAG = '"' + hashlib.blake2b(_CACHE_BYTES, digest_size=8).hexdigest() + '"'
+    return _CACHE_BYTES, _ETAG
+
+
+def load_data_bytes() -> Tuple[bytes, str]:
+    """Return the patients dictionary encoded as JSON bytes, with its ETag.
+
+    The encoding and its hash are computed at most once per change to the
+    data, so repeated reads are a plain lookup. The ETag changes whenever
+    any record does.
+    """
+    with _LOCK:
+        return _encode_locked()
+
+
+def load_data_with_etag() -> Tuple[Dict[str, Any], str]:
+    """Return `load_data()` together with a version tag for that snapshot.
+
+    Unlike `load_data_bytes` the tag is not a content hash, so this never
+    encodes the dataset; it changes whenever any record does.
+    """
+    with _LOCK:
+        data = _load_locked()
+        return data, f'"{_BOOT_ID}-{_GENERATION}"'
+
+
+def insert_patients(records: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Insert new patients in a single transaction.
+
+    `records` maps canonical IDs to records containing `FIELDS` plus the
+    derived ``bmi`` and ``verdict``, which are cached as given instead of
+    being read back. If any ID already exists nothing is written and the
+    conflicting IDs are returned; an empty list means every record was
+    inserted.
+    """
+    ids = list(records)
+    with _LOCK:
+        data = _load_locked()
+        conn = _connect()
+        with _transaction(conn):
+            existing = []
+            # one lookup per chunk, kept under SQLite's bound-parameter limit
+            for start in range(0, len(ids), _MAX_PARAMS):
+                chunk = ids[start:start + _MAX_PARAMS]
+                placeholders = ", ".join("?" for _ in chunk)
+                existing += [
+                    row[0] for row in
+                    conn.execute(f"SELECT id FROM patients WHERE id IN ({placeholders})", chunk)
+                ]
+            if existing:
+                return existing
+            conn.executemany(
+                _INSERT, ((pid, *(r[f] for f in FIELDS)) for pid, r in records.items())
+            )
+        for pid, r in records.items():
+            record = {f: r[f] for f in FIELDS}
+            record["bmi"] = r["bmi"]
+            record["verdict"] = r["verdict"]
+            data[pid] = record
+        _invalidate()
+        return []
+
+
+def update_patient_record(patient_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Set the given fields on one patient and return the updated record.
+
+    Only the changed columns are written; BMI and verdict follow from the
+    stored height and weight. Returns ``None`` if the patient doesn't exist.
+    """
+    unknown = set(changes) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown patient fields: {sorted(unknown)}")
+    with _LOCK:
+        data = _load_locked()
+        conn = _connect()
+        with _transaction(conn):
+            if changes:
+                assignments = ", ".join(f"{k} = ?" for k in changes)
+                conn.execute(
+                    f"UPDATE patients SET {assignments} WHERE id = ?",
+                    (*changes.values(), patient_id),
+                )
+            record = _fetch_record(conn, patient_id)
+        if record is None:
+            return None
+        data[patient_id] = record
+        _invalidate()
+        return record
+
+
+def delete_patient_record(patient_id: str) -> bool:
+    """Delete one patient; returns ``False`` if the patient doesn't exist."""
+    with _LOCK:
+        data = _load_locked()
+        conn = _connect()
+        with _transaction(conn):
+            deleted = conn.execute("DELETE FROM patients WHERE id = ?", (patient_id,)).rowcount
+        if not deleted:
+            return False
+        data.pop(patient_id, None)
+        _invalidate()
+        return True
+
+
+def bmi_for(height: float, weight: float) -> float:
+    """Return the BMI for one patient, rounded to two decimals."""
+    return round(weight / (height ** 2), 2)
+
+
+def verdict_for(bmi: float) -> str:
+    """Return the health verdict for a single (rounded) BMI value."""
+    return VERDICTS[bisect_right(BMI_THRESHOLDS, bmi)]
+
+
+def verdict_codes(bmi: np.ndarray) -> np.ndarray:
+    """Classify a whole column of rounded BMI values at once.
+
+    Returns an ``int8`` array of indexes into `VERDICTS`; each code is the
+    same one `verdict_for` picks for that value.
+    """
+    return np.searchsorted(BMI_THRESHOLDS, bmi, side="right").astype(np.int8)
+
+
+def _build_columns(data: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Split the numeric fields of every record into contiguous arrays.
 
-    Returns the raw dictionary as stored on disk. The function raises the
-    usual IO errors if the file is missing or invalid JSON — callers can
-    handle or propagate those as needed.
+    The BMI column is the rounded value the records already carry, so the
+    sort order always agrees with the BMI the API reports. Every cached
+    record has all `FIELDS` (the columns are NOT NULL), so values are
+    pulled with C-level `itemgetter` calls. The records are also materialized into `_ROWS` in column order
+    so a sort result is a plain list lookup per index.
     """
-    with open("patients.json", "r") as f:
-        return json.load(f)
+    global _ROWS
+    _ROWS = list(data.values())
+    n = len(_ROWS)
+    heights = np.fromiter(map(itemgetter("height"), _ROWS), dtype=np.float64, count=n)
+    weights = np.fromiter(map(itemgetter("weight"), _ROWS), dtype=np.float64, count=n)
+    bmi = np.fromiter(map(itemgetter("bmi"), _ROWS), dtype=np.float64, count=n)
+    return {"height": heights, "weight": weights, "bmi": bmi}
 
 
-def save_data(data: Dict[str, Any]) -> None:
-    """Write the full patients dictionary back to `patients.json`.
+def sort_records(sort_by: str, descending: bool = False) -> List[Dict[str, Any]]:
+    """Return patient records ordered by the numeric column `sort_by`.
 
-    This overwrites the file. It's intentionally simple for the demo. In a
-    production setting you'd add atomic writes and concurrency controls.
+    `sort_by` must be one of ``"bmi"``, ``"weight"`` or ``"height"``. The
+    sort is stable, so patients with equal values keep their stored order
+    in both directions. The returned records are the cached ones, so
+    callers must not modify them.
     """
-    with open("patients.json", "w") as f:
-        json.dump(data, f, indent=2)
+    global _ARRAYS
+    with _LOCK:
+        data = _load_locked()
+        if _ARRAYS is None:
+            _ARRAYS = _build_columns(data)
+        column = _ARRAYS[sort_by]
+        idx = np.argsort(-column if descending else column, kind="stable")
+        rows = _ROWS
+        # .tolist() yields plain ints, avoiding a NumPy scalar per lookup
+        return [rows[i] for i in idx.tolist()]